@@ -3,15 +3,20 @@
 import subprocess
 import sys
 import os
-import os.path
+from pathlib import Path
+import importlib
 
-import configparser
-import argparse
-from typing import Any
-import shlex
+import re
+import logging
+from typing import Any, Optional
+from functools import lru_cache
 
 
+_PROGNAME = os.path.basename(sys.argv[0])
 verbose_level = 1
+CONFIG_FILE = ".robotpy.toml"
+# INI-formatted config used by older versions. Migrated to CONFIG_FILE on the next write.
+LEGACY_CONFIG_FILE = ".robotpy"
 skeleton_main = """import wpilib
 
 class Robot(wpilib.TimedRobot):
@@ -39,45 +44,79 @@ if __name__ == "__main__":
 """
 
 def has_git_installed():
-    res = subprocess.run(["git", "--version"])
-    return res.returncode == 0
+    import shutil
+
+    return shutil.which("git") is not None
 
 
 def python(args: list[str], **kwargs) -> subprocess.CompletedProcess:
-    global verbose_level
-    if "capture_output" not in kwargs:
-        kwargs["capture_output"] = verbose_level <= 1
-    return subprocess.run([sys.executable] + args, text=True, **kwargs)
+    if "capture_output" not in kwargs and "stdout" not in kwargs and verbose_level <= 1:
+        # discard normal output without buffering it, but keep errors around for reporting
+        kwargs["stdout"] = subprocess.DEVNULL
+        kwargs["stderr"] = subprocess.PIPE
+    return subprocess.run([sys.executable] + args, text=True, bufsize=-1, **kwargs)
 
 def rpinst(args: list[str]) -> subprocess.CompletedProcess:
-    global verbose_level
     return python(["-m", "robotpy_installer"] + args)
 
+_ROBOTPY_ADDONS = frozenset({"ctre", "navx", "photonvision", "pathplannerlib", "rev", "apriltag", "commands2", "commands-v2", "cscore", "romi", "sim"})
+_ROBOTPY_ADDON_NAMES = {"commands2": "commands-v2"}
+
 def is_robotpy_addon(name: str) -> bool:
-    return name in ["ctre", "navx", "photonvision", "pathplannerlib", "rev", "apriltag", "commands2", "commands-v2", "cscore", "romi", "sim"]
+    return name in _ROBOTPY_ADDONS
 
 def format_robotpy_addon(name: str) -> str:
-    if name == "commands2":
-        name = "commands-v2"
-    return "robotpy-"+name
+    return "robotpy-"+_ROBOTPY_ADDON_NAMES.get(name, name)
+
+log = logging.getLogger(_PROGNAME)
+
+class _BraceMessage:
+    # defers str.format until a handler actually emits the record
+    def __init__(self, fmt: str, args: tuple) -> None:
+        self.fmt = fmt
+        self.args = args
+
+    def __str__(self) -> str:
+        return self.fmt.format(*self.args) if self.args else self.fmt
+
+class _Formatter(logging.Formatter):
+    prefixes = {logging.WARNING: "warning: ", logging.ERROR: "error: ", logging.CRITICAL: "fatal: "}
+
+    def format(self, record: logging.LogRecord) -> str:
+        return "{}: {}{}".format(record.name, self.prefixes.get(record.levelno, ""), record.getMessage())
+
+def configure_logging(verbose: int) -> None:
+    if not log.handlers:
+        # normal output goes to stdout, errors to stderr
+        out = logging.StreamHandler(sys.stdout)
+        out.addFilter(lambda record: record.levelno < logging.ERROR)
+        err = logging.StreamHandler(sys.stderr)
+        err.setLevel(logging.ERROR)
+        for handler in (out, err):
+            handler.setFormatter(_Formatter())
+            log.addHandler(handler)
+        log.propagate = False
+
+    if verbose >= 2:
+        log.setLevel(logging.DEBUG)
+    elif verbose == 1:
+        log.setLevel(logging.INFO)
+    elif verbose == 0:
+        log.setLevel(logging.ERROR)
+    else:
+        log.setLevel(logging.CRITICAL + 1)
 
-def msg(m: str, target=sys.stdout) -> None:
-    global verbose_level
-    if (verbose_level < 1 and target != sys.stderr) or verbose_level < 0:
-        return
-    print("{}: {}".format(os.path.basename(sys.argv[0]), m), file=target)
+def msg(m: str, *args: Any) -> None:
+    log.info(_BraceMessage(m, args))
 
 def warn(m: str, *args: Any) -> None:
-    m = m.format(*args)
-    msg("warning: {}".format(m))
+    log.warning(_BraceMessage(m, args))
 
 def error(m: str, *args: Any) -> None:
-    m = m.format(*args)
-    msg("error: {}".format(m), target=sys.stderr)
+    log.error(_BraceMessage(m, args))
 
 def fatal(m: str, *args: Any) -> None:
-    m = m.format(*args)
-    msg("fatal: {}".format(m), sys.stderr)
+    log.critical(_BraceMessage(m, args))
     sys.exit(1)
 
 def expect_result(result: subprocess.CompletedProcess, msg: str, absolute: bool = True) -> bool:
@@ -88,42 +127,147 @@ def expect_result(result: subprocess.CompletedProcess, msg: str, absolute: bool
             error(msg)
     return result.returncode == 0
 
+def has_config(directory: Path) -> bool:
+    return (directory / CONFIG_FILE).is_file() or (directory / LEGACY_CONFIG_FILE).is_file()
+
 def move_to_robotpy_dir() -> None:
-    while not os.path.isfile(".robotpy"):
-        os.chdir("..")
-        if os.path.dirname(os.getcwd()) == os.getcwd():
-            fatal("Current directory is not in a robotpy project")
+    cwd = Path.cwd().resolve()
+    for d in [cwd, *cwd.parents]:
+        if has_config(d):
+            if d != cwd:
+                os.chdir(d)
+                reset_config()
+            return
+    fatal("Current directory is not in a robotpy project")
 
 config = None
-def load_config() -> configparser.ConfigParser:
+def load_config() -> dict[str, dict[str, str]]:
     global config
+    global _config_dirty
     if config is None:
-        config = configparser.ConfigParser()
-        config.read(".robotpy")
+        if os.path.isfile(CONFIG_FILE):
+            try:
+                import tomllib
+            except ImportError:
+                import tomli as tomllib
+            with open(CONFIG_FILE, "rb") as f:
+                data = tomllib.load(f)
+            config = {group: {name: str(value) for name, value in fields.items()}
+                      for group, fields in data.items() if isinstance(fields, dict)}
+        elif os.path.isfile(LEGACY_CONFIG_FILE):
+            import configparser
+            legacy = configparser.ConfigParser()
+            legacy.read(LEGACY_CONFIG_FILE)
+            config = {group: dict(legacy[group]) for group in legacy.sections()}
+            _config_dirty = True
+        else:
+            config = {}
     return config
 
+def reset_config() -> None:
+    # call after changing directory. Anything loaded so far came from the old directory, not this project
+    global config
+    global _config_dirty
+    config = None
+    _config_dirty = False
+
+_TOML_BARE_KEY = re.compile(r"[A-Za-z0-9_-]+")
+def _toml_string(s: str) -> str:
+    escaped = []
+    for c in s:
+        if c in "\\\"":
+            escaped.append("\\" + c)
+        elif c < " " or c == "\x7f":
+            escaped.append("\\u{:04x}".format(ord(c)))
+        else:
+            escaped.append(c)
+    return '"{}"'.format("".join(escaped))
+
+def _toml_key(key: str) -> str:
+    return key if _TOML_BARE_KEY.fullmatch(key) else _toml_string(key)
+
+def write_config() -> None:
+    # the config is only ever groups of string fields, so this is all the TOML we need to write
+    lines = []
+    for group, fields in load_config().items():
+        lines.append("[{}]".format(_toml_key(group)))
+        for name, value in fields.items():
+            lines.append("{} = {}".format(_toml_key(name), _toml_string(value)))
+        lines.append("")
+    with open(CONFIG_FILE, "w") as f:
+        f.write("\n".join(lines))
+    if os.path.isfile(LEGACY_CONFIG_FILE):
+        os.remove(LEGACY_CONFIG_FILE)
+
+_config_dirty = False
+def set_config(group: str, name: str, value: str) -> None:
+    global _config_dirty
+    load_config().setdefault(group, {})[name] = value
+    _config_dirty = True
+
+def del_config(group: str, name: Optional[str] = None) -> bool:
+    # removes a single field, or the whole group if no name is given. Empty groups are dropped.
+    # Returns whether anything was removed.
+    global _config_dirty
+    config = load_config()
+    fields = config.get(group)
+    if fields is None:
+        return False
+    if name is not None and fields.pop(name, None) is None:
+        return False
+    if name is None or len(fields) == 0:
+        config.pop(group)
+    _config_dirty = True
+    return True
+
 packages = None
 def load_packages(refresh: bool = False) -> dict[str, str]:
     global packages
     if packages is None or refresh:
-        res = python(["-m", "pip", "freeze"], capture_output=True)
-        if res.returncode != 0:
-            fatal("Couldn't load installed packages.")
-        reqs = res.stdout.splitlines()
-        splits = [desc.split("==") for desc in reqs]
-        # just ignore local packages for now
-        reqs = {req[0]: req[1] for req in splits if len(req) == 2}
+        from importlib.metadata import distributions
+
+        # pip installs in a subprocess, so make sure newly added distributions are seen
+        importlib.invalidate_caches()
+        reqs = {}
+        for dist in distributions():
+            # like pip, the first distribution found on sys.path wins
+            reqs.setdefault(dist.metadata["Name"], dist.version)
         packages = reqs
     return packages
 
+def package_version(name: str) -> Optional[str]:
+    # looks up a single distribution without listing every installed package
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+def requirement_name(req: str) -> Optional[str]:
+    # "numpy==1.26" -> "numpy". None for things that aren't requirements, like local paths
+    from packaging.requirements import InvalidRequirement, Requirement
+
+    try:
+        return Requirement(req).name
+    except InvalidRequirement:
+        return None
+
+def is_outdated(current: str, latest: str) -> bool:
+    from packaging.version import InvalidVersion, Version
+
+    try:
+        return Version(current) < Version(latest)
+    except InvalidVersion:
+        # can't order non-PEP 440 versions, so treat any difference as outdated
+        return current != latest
+
 def write_auth_config() -> None:
     config = load_config()
 
     auth = "[auth]\nhostname = {}\n".format(config["auth"]["hostname"])
-    with open(".deploy_cfg", "w") as f:
-        f.write(auth)
-    with open(".installer_config", "w") as f:
-        f.write(auth)
+    for path in (".deploy_cfg", ".installer_config"):
+        Path(path).write_text(auth)
 
 def install_package(pkgs: list[str], download: bool = True) -> None:
     if len(pkgs) == 0:
@@ -131,52 +275,68 @@ def install_package(pkgs: list[str], download: bool = True) -> None:
 
     config = load_config()
 
-    for pkg in pkgs:
-        msg("Installing package '{}'".format(pkg))
-        res = python(["-m", "pip", "install", "--upgrade", pkg])
-        expect_result(res, "Installing package failed unexpectedly", absolute=False)
-        if res.returncode != 0:
-            continue
-
-        if download:
-            msg("Downloading package '{}' for robot installations".format(pkg))
-            res = rpinst(["download", pkg])
-            expect_result(res, "Downloading package for remote use failed unexpectedly", absolute=False)
-            if res.returncode != 0:
-                continue
+    msg("Installing packages: {}".format(", ".join(pkgs)))
+    res = python(["-m", "pip", "install", "--upgrade"] + pkgs)
+    if res.returncode != 0:
+        # pip reports each unresolvable requirement on its own "ERROR:" line
+        if res.stderr:
+            for line in res.stderr.splitlines():
+                if line.startswith("ERROR:"):
+                    error(line[len("ERROR:"):].strip())
+        error("Installing packages failed unexpectedly")
+        return
 
-            packages = load_packages(refresh=True)
+    if download:
+        msg("Downloading packages for robot installations: {}".format(", ".join(pkgs)))
+        res = rpinst(["download"] + pkgs)
+        if not expect_result(res, "Downloading packages for remote use failed unexpectedly", absolute=False):
+            return
 
-            if pkg not in config["requirements"] or config["requirements"][pkg] < packages[pkg]:
-                config["requirements"][pkg] = packages[pkg]
+        # pip installs in a subprocess, so make sure newly added distributions are seen
+        importlib.invalidate_caches()
 
+        for pkg in pkgs:
+            name = requirement_name(pkg)
+            if name is None:
+                error("'{}' is not a package requirement, so it can't be registered", pkg)
+                continue
+            installed = package_version(name)
+            if installed is None:
+                # e.g. pip fell back to a user site directory that didn't exist when we started
+                error("'{}' was installed but can't be found in this environment. Re-run the command to register it", name)
+                continue
+            if name not in config["requirements"] or is_outdated(config["requirements"][name], installed):
+                set_config("requirements", name, installed)
 
-    
 
 def initialize(args) -> None:
 
-    target = args.directory
-    if target is not None:
-        if os.path.exists(args.directory) and not os.path.isdir(args.directory):
-            fatal("{} already exists but is not a directory".format("args.directory"))
-        os.makedirs(args.directory, exist_ok=True)
+    if args.directory is not None:
+        target = Path(args.directory)
+        if target.exists() and not target.is_dir():
+            fatal("{} already exists but is not a directory", target)
+        target.mkdir(parents=True, exist_ok=True)
+        target = target.resolve()
     else:
-        target = os.path.abspath(".")
+        target = Path.cwd()
 
     os.chdir(target)
+    reset_config()
     # Only do initialization work after this point
 
-    config = load_config()
-    if os.path.isfile(".robotpy"):
-        msg("{} already exists. If you want to reset, delete the file an re-run `robotpy init`".format(os.path.join(target, ".robotpy")))
+    fresh = not has_config(target)
+    if not fresh:
+        msg("{} already exists. If you want to reset, delete the file an re-run `robotpy init`", target / CONFIG_FILE)
     else:
-        packages = load_packages()
-        config["requirements"] = {"robotpy": packages["robotpy"]}
+        robotpy_version = package_version("robotpy")
+        if robotpy_version is None:
+            fatal("robotpy is not installed")
+        set_config("requirements", "robotpy", robotpy_version)
 
-    config["exec"] = {"main": args.main}
+    set_config("exec", "main", args.main)
     
     if args.host is not None:
-        config["auth"] = {"hostname": args.host}
+        set_config("auth", "hostname", args.host)
         write_auth_config()
 
     if not args.bare:
@@ -186,19 +346,22 @@ def initialize(args) -> None:
             with open(args.main, "w") as f:
                 f.write(skeleton_main)
 
-    if args.git:
+    if args.git and not (target / ".git").exists():
         if has_git_installed():
-            subprocess.run(["git", "init"])
+            subprocess.run(["git", "init"], check=False)
         else:
             warn("can't find git. Skipping git initialization")
 
-    msg("Downloading python for robot installation")
-    res = rpinst(["download-python"])
-    expect_result(res, "Downloading Python failed unexpectedly")
+    if fresh or args.force:
+        msg("Downloading python for robot installation")
+        res = rpinst(["download-python"])
+        expect_result(res, "Downloading Python failed unexpectedly")
 
-    msg("Downloading robotpy for robot installations")
-    res = rpinst(["download", "robotpy"])
-    expect_result(res, "Downloading robotpy for remote use failed unexpectedly")
+        msg("Downloading robotpy for robot installations")
+        res = rpinst(["download", "robotpy"])
+        expect_result(res, "Downloading robotpy for remote use failed unexpectedly")
+    else:
+        msg("Skipping robot downloads for existing project. Use --force to download anyway")
  
     pkgs = [(format_robotpy_addon(name) if is_robotpy_addon(name) else name) for name in args.packages]
     install_package(pkgs)
@@ -206,7 +369,6 @@ def initialize(args) -> None:
 
 def remove(args) -> None:
     move_to_robotpy_dir()
-    config = load_config()
     for pkg in args.packages:
         if pkg == "robotpy":
             error("robotpy can't be removed from requirements")
@@ -214,9 +376,7 @@ def remove(args) -> None:
         if is_robotpy_addon(pkg):
             pkg = format_robotpy_addon(pkg)
         
-        if pkg in config["requirements"]:
-            del config["requirements"][pkg]
-        else:
+        if not del_config("requirements", pkg):
             error("'{}' is not installed in this project", pkg)
 
 def install(args) -> None:
@@ -224,7 +384,7 @@ def install(args) -> None:
 
     pkgs = [(format_robotpy_addon(name) if is_robotpy_addon(name) else name) for name in args.packages]
         
-    install_package(pkgs, download = args.download)
+    install_package(pkgs, download=args.download)
 
 
 def update(args) -> None:
@@ -232,7 +392,7 @@ def update(args) -> None:
     config = load_config()
     pkgs = args.packages
     if len(pkgs) == 0:
-        pkgs = [pkg for pkg in config["requirements"]]
+        pkgs = [pkg for pkg in config["requirements"] if pkg != "robotpy"]
         pkgs = ["robotpy"] + pkgs
 
     for pkg in pkgs:
@@ -248,9 +408,8 @@ def run_checks(tools) -> None:
     config = load_config()
 
     stop_on_fail = True
-    if "analyze" in config and "onfail" in config["analyze"]:
-        if config["analyze"]["onfail"] == "continue":
-            stop_on_fail = False
+    if config.get("analyze", {}).get("onfail") == "continue":
+        stop_on_fail = False
 
     for tool in tools:
         msg("running analyzer: {}".format(tool))
@@ -264,8 +423,9 @@ def analyze(args) -> None:
     if args.add is not None:
         packages = load_packages()
         tools = []
+        installed = False
         for tool in args.add:
-            if "analyze.tools" in config and tool in config["analyze.tools"]:
+            if tool in config.get("analyze.tools", {}):
                 msg("{} is already registered".format(tool))
                 continue
             if tool not in packages:
@@ -274,29 +434,25 @@ def analyze(args) -> None:
                 if expect_result(res, "Installation failed. Skipping {}".format(tool), absolute=False):
                     msg("analyzer '{}' added".format(tool))
                     tools.append(tool)
+                    installed = True
             else:
                 msg("analyzer '{}' added".format(tool))
                 tools.append(tool)
 
-        packages = load_packages(refresh=True)
-
-        if "analyze.tools" not in config and len(tools) != 0:
-            config["analyze.tools"] = {}
+        if installed:
+            packages = load_packages(refresh=True)
 
         for tool in tools:
-            config["analyze.tools"][tool] = packages[tool]
+            set_config("analyze.tools", tool, packages[tool])
     elif args.remove is not None:
         if "analyze.tools" not in config:
             msg("no tools registered")
             sys.exit(1)
         for tool in args.remove:
-            if tool in config["analyze.tools"]:
-                del config["analyze.tools"][tool]
+            if del_config("analyze.tools", tool):
                 msg("analyzer '{}' removed".format(tool))
             else:
                 warn("{} is not a rgistered analyzer", tool)
-        if len(config["analyze.tools"]) == 0:
-            del(config["analyze.tools"])
     elif args.list:
         if "analyze.tools" not in config:
             return
@@ -324,24 +480,19 @@ def deploy(args) -> None:
     move_to_robotpy_dir()
     config = load_config()
 
-    if not "auth" in config or not "hostname" in config["auth"]:
+    if "hostname" not in config.get("auth", {}):
         host = input("Enter host name or team number: ").strip()
         if len(host) == 0:
             fatal("No hostname supplied")
         
-        if "auth" not in config:
-            config["auth"] = {}
-        config["auth"]["hostname"] = host
+        set_config("auth", "hostname", host)
         write_auth_config()
 
     if args.deploy_lib:
-        if "requirements.deployed" not in config:
-            config["requirements.deployed"] = {}
-        
-        deployed = config["requirements.deployed"]
+        deployed = config.get("requirements.deployed", {})
         pkgs = config["requirements"]
 
-        updates = [pkg for pkg in pkgs if pkg not in deployed or deployed[pkg] < pkgs[pkg]]
+        updates = [pkg for pkg in pkgs if pkg not in deployed or is_outdated(deployed[pkg], pkgs[pkg])]
 
         if len(updates) != 0:
             msg("Package requirements updated since last deploy")
@@ -349,7 +500,9 @@ def deploy(args) -> None:
             res = rpinst(["install"] + updates)
             expect_result(res, "Updating packages on remote target failed unexpectedly")
 
-            config["requirements.deployed"] = config["requirements"]
+            del_config("requirements.deployed")
+            for pkg in pkgs:
+                set_config("requirements.deployed", pkg, pkgs[pkg])
 
     if args.deploy_code:
         if args.analyze and "analyze.tools" in config:
@@ -380,119 +533,142 @@ def configure(args) -> None:
         sys.exit(1)
 
     if args.clear:
-        if group in config and name in config[group]:
-            del config[group][name]
-            if len(config[group]) == 0:
-                del config[group]
+        del_config(group, name)
     elif args.value is not None:
-        if group not in config:
-            config[group] = {}
-        config[group][name] = args.value
+        set_config(group, name, args.value)
         if group == "auth" and name == "hostname":
             write_auth_config()
 
     else:
-        if group in config and name in config[group]:
-            print(config[group][name])
-
-
-parser = argparse.ArgumentParser()
-subparsers = parser.add_subparsers(required=True, title="subcommands", 
-                                   description="These are the options you can use with the robotpy command", 
-                                   metavar="<subcommand>")
-
-parser.set_defaults(verbose_level=1)
-parser.add_argument("-v", "--verbose", action="store_const", dest="verbose_level", const=2, 
-                    help="set output to show the output of underlying commands (pip, robotpy_installer, etc.)")
-parser.add_argument("-q", "--quiet", action="store_const", dest="verbose_level", const=0, 
-                    help="don't show normal output. Still shows errors")
-parser.add_argument("--silent", action="store_const", dest="verbose_level", const=-1, 
-                    help="don't show any output, even errors")
-
-init_parser = subparsers.add_parser("initialize", aliases=["init"], 
-                                    help="Creates a new RobotPy project", usage="%(prog)s [<options>] [directory]")
-init_parser.add_argument("-m", "--main", default="robot.py", help="set main file to MAIN")
-init_parser.add_argument("--bare", action="store_true", help="don't create any skeleton files")
-init_parser.add_argument("--host", dest="host", help="set the hostname of the eventual target")
-init_parser.add_argument("-t", "--team", dest="host", help="alias for --host")
-init_parser.add_argument("--git", action=argparse.BooleanOptionalAction, default=True, help="create git repo in new project (default: true)")
-# requires 3.8+
-init_parser.add_argument("--with", dest="packages", nargs="+", action="extend", default=[], help="install packages alongside initialization")
-init_parser.add_argument("directory", nargs="?", help="create project inside directory (default: current directory)")
-init_parser.set_defaults(func=initialize)
-
-# install [--[no-]download] {packages}
-install_parser = subparsers.add_parser("install", help="Installs packages to current project", 
-                                       usage="%(prog)s [<options>] <packages>", 
-                                       epilog="Specifying --no-download makes this command work almost like `pip install <packages>`")
-install_parser.set_defaults(func=install)
-install_parser.add_argument("--download", action=argparse.BooleanOptionalAction, 
-                            help="download the package for use on the robot (default: true)")
-install_parser.add_argument("packages", nargs="+", help="packages to install")
-
-# handles updates to robotpy (can accept components)
-update_parser = subparsers.add_parser("update", help="Updates installed packages (including robotpy)", usage="%(prog)s [<options>] [<packages>]")
-update_parser.set_defaults(func=update)
-update_parser.add_argument("--download", action=argparse.BooleanOptionalAction, 
-                           help="download the updated package for use on the robot (default: true)")
-update_parser.add_argument("packages", nargs="*", help="packages to update. All if not specified")
-
-remove_parser = subparsers.add_parser("remove", help="Unregisters packages from current project", usage="%(prog)s <packages>")
-remove_parser.set_defaults(func=remove)
-remove_parser.add_argument("packages", nargs="+", help="packages to remove")
-
-
-check_parser = subparsers.add_parser("analyze", help="Manages and executes static analyzers", 
-                                     usage="%(prog)s [-h] [-l | -a <tools>] | -r <tools> | --use <tools>]")
-check_parser.set_defaults(func=analyze)
-check_group = check_parser.add_mutually_exclusive_group()
-check_group.add_argument("-a", "--add", nargs="+", help="add tool(s) to project")
-check_group.add_argument("-l", "--list", action="store_true", help="print registered tools")
-check_group.add_argument("--use", nargs="+", help="use only selected tool(s)")
-check_group.add_argument("-r", "--remove", nargs="+", help="remove tool(s) from project")
-
-deploy_parser = subparsers.add_parser("deploy", help="Deploys code and libraries to the robot", usage="%(prog)s [<options>]")
-deploy_parser.set_defaults(func=deploy)
-deploy_parser.add_argument("--no-code", dest="deploy_code", action="store_false", help="prevent code from being deployed")
-deploy_parser.add_argument("--no-lib", dest="deploy_lib", action="store_false", help="prevent libraries from being updated")
-deploy_parser.add_argument("--analyze", action=argparse.BooleanOptionalAction, help="statically analyze code before deploy (default: true)")
-
-
-config_parser = subparsers.add_parser("config", help="Get and set project options", 
-                                      usage="%(prog)s [<options>] key [value]", 
-                                      formatter_class=argparse.RawDescriptionHelpFormatter,
-                                      epilog="Keys are specified in the <group>.<field> format (all but the last '.' are part\n"\
-                                              "of the group name). Any name without a period is invalid. Changing anything in\n"\
-                                              "the 'requirements' or 'requirements.deployed' groups is disallowed.")
-config_parser.set_defaults(func=configure)
-config_parser.add_argument("field", help="dot-separated name of the setting")
-config_parser.add_argument("value", nargs="?", help="value to be set. Displays the current value if not given")
-config_parser.add_argument("--clear", action="store_true", help="unset the field")
+        value = config.get(group, {}).get(name)
+        if value is not None:
+            print(value)
+
+
+@lru_cache(maxsize=1)
+def build_parser():
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=_PROGNAME)
+    subparsers = parser.add_subparsers(required=True, title="subcommands", 
+                                       description="These are the options you can use with the robotpy command", 
+                                       metavar="<subcommand>")
+
+    parser.set_defaults(verbose_level=1)
+    parser.add_argument("-v", "--verbose", action="store_const", dest="verbose_level", const=2, 
+                        help="set output to show the output of underlying commands (pip, robotpy_installer, etc.)")
+    parser.add_argument("-q", "--quiet", action="store_const", dest="verbose_level", const=0, 
+                        help="don't show normal output. Still shows errors")
+    parser.add_argument("--silent", action="store_const", dest="verbose_level", const=-1, 
+                        help="don't show any output, even errors")
+
+    init_parser = subparsers.add_parser("initialize", aliases=["init"], 
+                                        help="Creates a new RobotPy project", usage="%(prog)s [<options>] [directory]")
+    init_parser.add_argument("-m", "--main", default="robot.py", help="set main file to MAIN")
+    init_parser.add_argument("--bare", action="store_true", help="don't create any skeleton files")
+    init_parser.add_argument("--host", dest="host", help="set the hostname of the eventual target")
+    init_parser.add_argument("-t", "--team", dest="host", help="alias for --host")
+    init_parser.add_argument("--git", action=argparse.BooleanOptionalAction, default=True, help="create git repo in new project (default: true)")
+    init_parser.add_argument("--force", action="store_true", help="download python and robotpy for the robot even if the project already exists")
+    # requires 3.8+
+    init_parser.add_argument("--with", dest="packages", nargs="+", action="extend", default=[], help="install packages alongside initialization")
+    init_parser.add_argument("directory", nargs="?", help="create project inside directory (default: current directory)")
+    init_parser.set_defaults(func=initialize)
+
+    # install [--[no-]download] {packages}
+    install_parser = subparsers.add_parser("install", help="Installs packages to current project", 
+                                           usage="%(prog)s [<options>] <packages>", 
+                                           epilog="Specifying --no-download makes this command work almost like `pip install <packages>`")
+    install_parser.set_defaults(func=install)
+    install_parser.add_argument("--download", action=argparse.BooleanOptionalAction, 
+                                help="download the package for use on the robot (default: true)")
+    install_parser.add_argument("packages", nargs="+", help="packages to install")
+
+    # handles updates to robotpy (can accept components)
+    update_parser = subparsers.add_parser("update", help="Updates installed packages (including robotpy)", usage="%(prog)s [<options>] [<packages>]")
+    update_parser.set_defaults(func=update)
+    update_parser.add_argument("--download", action=argparse.BooleanOptionalAction, 
+                               help="download the updated package for use on the robot (default: true)")
+    update_parser.add_argument("packages", nargs="*", help="packages to update. All if not specified")
+
+    remove_parser = subparsers.add_parser("remove", help="Unregisters packages from current project", usage="%(prog)s <packages>")
+    remove_parser.set_defaults(func=remove)
+    remove_parser.add_argument("packages", nargs="+", help="packages to remove")
+
+
+    check_parser = subparsers.add_parser("analyze", help="Manages and executes static analyzers", 
+                                         usage="%(prog)s [-h] [-l | -a <tools>] | -r <tools> | --use <tools>]")
+    check_parser.set_defaults(func=analyze)
+    check_group = check_parser.add_mutually_exclusive_group()
+    check_group.add_argument("-a", "--add", nargs="+", help="add tool(s) to project")
+    check_group.add_argument("-l", "--list", action="store_true", help="print registered tools")
+    check_group.add_argument("--use", nargs="+", help="use only selected tool(s)")
+    check_group.add_argument("-r", "--remove", nargs="+", help="remove tool(s) from project")
+
+    deploy_parser = subparsers.add_parser("deploy", help="Deploys code and libraries to the robot", usage="%(prog)s [<options>]")
+    deploy_parser.set_defaults(func=deploy)
+    deploy_parser.add_argument("--no-code", dest="deploy_code", action="store_false", help="prevent code from being deployed")
+    deploy_parser.add_argument("--no-lib", dest="deploy_lib", action="store_false", help="prevent libraries from being updated")
+    deploy_parser.add_argument("--analyze", action=argparse.BooleanOptionalAction, help="statically analyze code before deploy (default: true)")
+
+
+    config_parser = subparsers.add_parser("config", help="Get and set project options", 
+                                          usage="%(prog)s [<options>] key [value]", 
+                                          formatter_class=argparse.RawDescriptionHelpFormatter,
+                                          epilog="Keys are specified in the <group>.<field> format (all but the last '.' are part\n"\
+                                                  "of the group name). Any name without a period is invalid. Changing anything in\n"\
+                                                  "the 'requirements' or 'requirements.deployed' groups is disallowed.")
+    config_parser.set_defaults(func=configure)
+    config_parser.add_argument("field", help="dot-separated name of the setting")
+    config_parser.add_argument("value", nargs="?", help="value to be set. Displays the current value if not given")
+    config_parser.add_argument("--clear", action="store_true", help="unset the field")
+
+    return parser, subparsers
 
 
 def main() -> None:
     global verbose_level
-    global subparsers
 
+    configure_logging(verbose_level)
+    parser, subparsers = build_parser()
     if len(sys.argv) == 1:
         parser.print_help(sys.stderr)
         sys.exit(1)
     
     config = load_config()
-    if "command" in config:
-        commands = config["command"]
+    commands = config.get("command", {})
+
+    # the parser is cached, so custom commands from an earlier call may still be registered.
+    # argparse can't remove subparsers, so make the ones this config doesn't define fail instead.
+    for name, custom in subparsers.choices.items():
+        if custom.get_default("command") is not None and name not in commands:
+            custom.set_defaults(func=lambda args, name=name: fatal("'{}' is not a command in this project", name))
+
+    if len(commands) != 0:
+        import argparse
+        import shlex
+
         for command in commands:
-            custom = subparsers.add_parser(command)
-            custom.add_argument("rest", nargs=argparse.REMAINDER)
-            custom.set_defaults(func=lambda args: subprocess.run(shlex.split(commands[command]) + args.rest))
+            # the parser is cached, so custom commands may already exist from an earlier call
+            custom = subparsers.choices.get(command)
+            if custom is None:
+                custom = subparsers.add_parser(command)
+                custom.add_argument("rest", nargs=argparse.REMAINDER)
+            elif custom.get_default("command") is None:
+                warn("custom command '{}' conflicts with a built-in subcommand. Skipping", command)
+                continue
+            # split once, and bind per command so each lambda runs its own command line
+            parts = shlex.split(commands[command])
+            custom.set_defaults(command=command, func=lambda args, parts=parts: subprocess.run(parts + args.rest))
 
 
     args = parser.parse_args()
     verbose_level = args.verbose_level
+    configure_logging(verbose_level)
     args.func(args)
 
-    with open(".robotpy", "w") as f:
-        config.write(f)
+    if _config_dirty:
+        write_config()
 
 
 if __name__ == "__main__":